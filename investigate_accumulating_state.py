@@ -13,50 +13,110 @@ Usage:
 """
 
 import sys
-import re
 import json
+import codecs
+from bisect import bisect_left, bisect_right
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass
+from functools import lru_cache
+
+_MSG_MARKER = "message from OpenAI: "
+_JSON_DECODER = json.JSONDecoder()
+_READ_BLOCK_SIZE = 16 * 1024 * 1024
+
+# OpenAI events recorded as state management events (this also covers the
+# speech_started / response.done cycle boundaries)
+_STATE_EVENT_TYPES = frozenset([
+    "input_audio_buffer.speech_started",
+    "input_audio_buffer.speech_stopped",
+    "input_audio_buffer.cleared",
+    "input_audio_buffer.committed",
+    "response.created",
+    "response.done",
+    "response.audio.done",
+    "session.created",
+    "session.updated"
+])
+# A tracked event always contains its quoted type name, whatever the JSON spacing
+_STATE_EVENT_MARKERS = tuple(f'"{event_type}"' for event_type in _STATE_EVENT_TYPES)
+
+@lru_cache(maxsize=1 << 17)
+def _parse_ts(timestamp_str: str) -> datetime:
+    """Convert an HH:MM:SS.mmm log timestamp to a datetime, memoized since many lines share one."""
+    return datetime(2025, 6, 5, int(timestamp_str[0:2]), int(timestamp_str[3:5]),
+                    int(timestamp_str[6:8]), int(timestamp_str[9:12]) * 1000)
+
+def _fmt_ts(ts: datetime) -> str:
+    """Format a datetime as HH:MM:SS.mmm without going through strftime."""
+    return f"{ts.hour:02d}:{ts.minute:02d}:{ts.second:02d}.{ts.microsecond // 1000:03d}"
 
-@dataclass
 class StateEvent:
-    timestamp: datetime
-    side: str
-    event_type: str
-    details: Dict
-    cycle_number: Optional[int] = None
+    # Slots drop the per-instance __dict__; declared by hand because
+    # dataclass(slots=True) needs Python 3.10
+    __slots__ = ('timestamp', 'side', 'event_type', 'details', 'cycle_number')
+
+    def __init__(self, timestamp: datetime, side: str, event_type: str,
+                 details: Dict, cycle_number: Optional[int] = None):
+        self.timestamp = timestamp
+        self.side = side
+        self.event_type = event_type
+        self.details = details
+        self.cycle_number = cycle_number
 
 class AccumulatingStateInvestigator:
     def __init__(self):
         self.events: List[StateEvent] = []
+        self.event_timestamps: List[datetime] = []  # parallel to self.events, in log order
+        self.buffer_events: List[StateEvent] = []
+        self.session_events: List[StateEvent] = []
         self.current_cycle = 0
         self.cycle_boundaries = {}  # cycle_number -> (start_time, end_time)
         
+    def add_event(self, event: StateEvent):
+        """Record an event, bucketing it for the analyses that only look at a subset."""
+        self.events.append(event)
+        self.event_timestamps.append(event.timestamp)
+        if "buffer" in event.event_type or "cleared" in event.event_type:
+            self.buffer_events.append(event)
+        if "session" in event.event_type:
+            self.session_events.append(event)
+            
     def parse_log_line(self, line: str):
         """Parse log lines to extract state management events."""
-        # Match timestamp pattern
-        timestamp_match = re.match(r'\[(\d{2}:\d{2}:\d{2}\.\d{3})\]', line)
-        if not timestamp_match:
+        # Cheap substring checks first - most lines are neither OpenAI messages
+        # nor buffer clearing logs, so they never reach timestamp or JSON parsing
+        if not line or line[0] != '[':
+            return
+        message_idx = line.find(_MSG_MARKER)
+        has_message = message_idx >= 0
+        has_buffer_clear = not has_message and "Cleared" in line and "input audio buffer" in line
+        if not has_message and not has_buffer_clear:
             return
             
-        timestamp_str = timestamp_match.group(1)
+        # Timestamps have the fixed form [HH:MM:SS.mmm], so slice the fields
+        # directly instead of going through strptime
+        if len(line) < 14 or line[13] != ']':
+            return
         try:
-            timestamp = datetime.strptime(f"2025-06-05 {timestamp_str}", "%Y-%m-%d %H:%M:%S.%f")
+            timestamp = _parse_ts(line[1:13])
         except ValueError:
             return
             
         # Look for state management events
-        if "message from OpenAI:" in line:
-            side = "caller" if "Caller message from OpenAI:" in line else "agent"
+        if has_message:
+            side = "caller" if line[message_idx - 7:message_idx] == "Caller " else "agent"
             
-            # Extract JSON message
-            json_match = re.search(r'message from OpenAI: ({.*})', line)
-            if not json_match:
+            # Decode the JSON message in place, straight after the marker
+            json_start = message_idx + len(_MSG_MARKER)
+            if not line.startswith("{", json_start):
+                return
+            # Most payloads (audio/transcript deltas) are never recorded, so skip
+            # decoding unless a tracked event type appears in the line
+            if not any(marker in line for marker in _STATE_EVENT_MARKERS):
                 return
                 
             try:
-                message_data = json.loads(json_match.group(1))
+                message_data, _ = _JSON_DECODER.raw_decode(line, json_start)
                 event_type = message_data.get("type", "")
                 
                 # Track cycle boundaries
@@ -70,18 +130,8 @@ class AccumulatingStateInvestigator:
                         self.cycle_boundaries[self.current_cycle][1] = timestamp
                 
                 # Track state management events
-                if event_type in [
-                    "input_audio_buffer.speech_started",
-                    "input_audio_buffer.speech_stopped", 
-                    "input_audio_buffer.cleared",
-                    "input_audio_buffer.committed",
-                    "response.created",
-                    "response.done",
-                    "response.audio.done",
-                    "session.created",
-                    "session.updated"
-                ]:
-                    self.events.append(StateEvent(
+                if event_type in _STATE_EVENT_TYPES:
+                    self.add_event(StateEvent(
                         timestamp=timestamp,
                         side=side,
                         event_type=event_type,
@@ -93,9 +143,9 @@ class AccumulatingStateInvestigator:
                 pass
                 
         # Look for buffer clearing logs
-        elif "Cleared" in line and "input audio buffer" in line:
+        elif has_buffer_clear:
             side = "caller" if "caller" in line.lower() else "agent"
-            self.events.append(StateEvent(
+            self.add_event(StateEvent(
                 timestamp=timestamp,
                 side=side,
                 event_type="buffer_cleared_log",
@@ -105,7 +155,7 @@ class AccumulatingStateInvestigator:
             
     def analyze_buffer_clearing_patterns(self) -> Dict:
         """Analyze if buffers are being cleared properly between cycles."""
-        buffer_events = [e for e in self.events if "buffer" in e.event_type or "cleared" in e.event_type]
+        buffer_events = self.buffer_events
         
         analysis = {
             "total_buffer_events": len(buffer_events),
@@ -162,25 +212,24 @@ class AccumulatingStateInvestigator:
             prev_end = self.cycle_boundaries[prev_cycle][1]
             curr_start = self.cycle_boundaries[curr_cycle][0]
             
-            if prev_end and curr_start:
-                gap_ms = int((curr_start - prev_end).total_seconds() * 1000)
-                analysis["cycle_gaps"].append({
-                    "from_cycle": prev_cycle,
-                    "to_cycle": curr_cycle,
-                    "gap_ms": gap_ms,
-                    "prev_end": prev_end.strftime("%H:%M:%S.%f")[:-3],
-                    "curr_start": curr_start.strftime("%H:%M:%S.%f")[:-3]
-                })
+            if not (prev_end and curr_start):
+                continue
                 
-        # Look for events that happen between cycles (indicating persistent state)
-        for gap in analysis["cycle_gaps"]:
-            prev_end = datetime.strptime(f"2025-06-05 {gap['prev_end']}", "%Y-%m-%d %H:%M:%S.%f")
-            curr_start = datetime.strptime(f"2025-06-05 {gap['curr_start']}", "%Y-%m-%d %H:%M:%S.%f")
+            gap_ms = int((curr_start - prev_end).total_seconds() * 1000)
+            gap = {
+                "from_cycle": prev_cycle,
+                "to_cycle": curr_cycle,
+                "gap_ms": gap_ms,
+                "prev_end": _fmt_ts(prev_end),
+                "curr_start": _fmt_ts(curr_start)
+            }
+            analysis["cycle_gaps"].append(gap)
             
-            between_events = [
-                e for e in self.events 
-                if prev_end < e.timestamp < curr_start
-            ]
+            # Look for events that happen between cycles (indicating persistent state).
+            # Events are recorded in log order, so bisect out the window instead of scanning
+            lo = bisect_right(self.event_timestamps, prev_end)
+            hi = bisect_left(self.event_timestamps, curr_start)
+            between_events = self.events[lo:hi]
             
             if between_events:
                 analysis["persistent_state_indicators"].append({
@@ -193,7 +242,7 @@ class AccumulatingStateInvestigator:
         
     def analyze_websocket_state_accumulation(self) -> Dict:
         """Analyze WebSocket connection state over time."""
-        session_events = [e for e in self.events if "session" in e.event_type]
+        session_events = self.session_events
         
         analysis = {
             "total_session_events": len(session_events),
@@ -203,7 +252,7 @@ class AccumulatingStateInvestigator:
         
         for event in session_events:
             analysis["session_timeline"].append({
-                "timestamp": event.timestamp.strftime("%H:%M:%S.%f")[:-3],
+                "timestamp": _fmt_ts(event.timestamp),
                 "side": event.side,
                 "event_type": event.event_type,
                 "cycle": event.cycle_number
@@ -317,6 +366,24 @@ class AccumulatingStateInvestigator:
             print("   - Multiple session events may indicate connection state issues")
             print("   - Consider periodic connection reset")
 
+def iter_log_lines(stream):
+    """Yield stripped, non-empty lines from a binary stream, reading it in large blocks."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    tail = ""
+    while True:
+        block = stream.read(_READ_BLOCK_SIZE)
+        lines = (tail + decoder.decode(block, final=not block)).split("\n")
+        tail = lines.pop()
+        for line in lines:
+            line = line.strip()
+            if line:
+                yield line
+        if not block:
+            break
+    tail = tail.strip()
+    if tail:
+        yield tail
+
 def main():
     """Main function to process log input."""
     investigator = AccumulatingStateInvestigator()
@@ -326,11 +393,9 @@ def main():
     print()
     
     line_count = 0
-    for line in sys.stdin:
-        line = line.strip()
-        if line:
-            investigator.parse_log_line(line)
-            line_count += 1
+    for line in iter_log_lines(sys.stdin.buffer):
+        investigator.parse_log_line(line)
+        line_count += 1
             
     print(f"Processed {line_count} log lines")
     print()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Shared plumbing for the OpenAI Realtime API test scripts.
+Holds the websocket connection setup, message (de)serialization and the ffmpeg
+audio conversions used by both test_openai_realtime.py and
+test_openai_realtime_with_vad.py.
+"""
+
+import asyncio
+import json
+import struct
+import websockets
+import ffmpeg
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+try:
+    import pybase64 as base64  # SIMD-accelerated drop-in replacement for the stdlib module
+except ImportError:
+    import base64
+
+if hasattr(base64, 'b64encode_as_string'):
+    # pybase64 can build the str directly, without an intermediate bytes object
+    b64encode_str = base64.b64encode_as_string
+    BASE64_BACKEND = f"pybase64 {base64.get_version()}"
+else:
+    def b64encode_str(data) -> str:
+        return base64.b64encode(data).decode('ascii')
+    BASE64_BACKEND = "stdlib base64"
+
+try:
+    import uvloop  # Faster libuv-based event loop for the websocket receive path
+except ImportError:
+    uvloop = None
+
+# uvloop.run was added in uvloop 0.18; older releases fall back to asyncio.run
+if uvloop is not None and not hasattr(uvloop, 'run'):
+    uvloop = None
+
+try:
+    import orjson  # Faster JSON (de)serialization for the websocket messages
+except ImportError:
+    orjson = None
+
+# loads_message accepts the raw bytes of a text frame as well as a str
+if orjson is not None:
+    def dumps_message(message) -> str:
+        # orjson returns bytes, but the Realtime API expects text frames
+        return orjson.dumps(message).decode('utf-8')
+    loads_message = orjson.loads
+else:
+    dumps_message = json.dumps
+    loads_message = json.loads
+
+# Audio is appended to the input buffer in slices of this many raw bytes
+AUDIO_APPEND_CHUNK_SIZE = 32 * 1024
+
+# Base64 never needs JSON escaping, so input_audio_buffer.append messages are
+# assembled around the encoded audio instead of serializing a dict per slice
+_APPEND_MESSAGE_PREFIX = '{"type":"input_audio_buffer.append","audio":"'
+_APPEND_MESSAGE_SUFFIX = '"}'
+
+# Commit the audio buffer to trigger processing; the event never changes, so it
+# is serialized once at import
+INPUT_AUDIO_COMMIT_MESSAGE = dumps_message({
+    'type': 'input_audio_buffer.commit'
+})
+
+def split_prompt(template: str) -> list:
+    """Split a prompt template around its [CALLER_LANGUAGE] placeholder."""
+    # Split once up front, so building the prompt for a caller is a single join
+    return template.split('[CALLER_LANGUAGE]')
+
+def build_prompt(parts: list, caller_language: str) -> str:
+    """Fill the caller's language into a prompt template split by split_prompt."""
+    return caller_language.join(parts)
+
+def run(main):
+    """Run the main coroutine on uvloop when it is installed, else on asyncio's loop."""
+    if uvloop is not None:
+        return uvloop.run(main)
+    return asyncio.run(main)
+
+# ffmpeg-python blocks until the subprocess exits, so every conversion runs on
+# this one long-lived worker thread to keep the event loop free (e.g. for the
+# websocket handshake). The conversions are small enough to run one at a time.
+FFMPEG_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ffmpeg')
+
+# The conversions never read the terminal or need the banner and progress log.
+# ffmpeg-python appends global args after the output file, so per-file options
+# such as -threads can't go here; they would be ignored as trailing options.
+FFMPEG_GLOBAL_ARGS = ('-nostdin', '-hide_banner', '-loglevel', 'error')
+
+# 8 kHz mono audio is too little work to be worth ffmpeg's autothreading; passed
+# as an output option to each conversion
+FFMPEG_THREADS = 1
+
+async def run_ffmpeg(stream, **kwargs):
+    """Run an ffmpeg-python stream on the ffmpeg worker thread and return its output."""
+    stream = stream.global_args(*FFMPEG_GLOBAL_ARGS)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(FFMPEG_EXECUTOR, partial(stream.run, **kwargs))
+
+async def connect_realtime(url: str, api_key: str):
+    """Open a websocket connection to the OpenAI Realtime API."""
+    headers = [
+        ('Authorization', f'Bearer {api_key}'),
+        ('OpenAI-Beta', 'realtime=v1')
+    ]
+    # websockets negotiates permessage-deflate by default, which suits the base64 audio
+    return await websockets.connect(
+        url,
+        additional_headers=headers,
+        max_size=None  # Don't cap the size of incoming messages
+    )
+
+async def append_audio(websocket, audio_data: bytes):
+    """Append raw G.711 μ-law audio to the input buffer of a Realtime session."""
+    # Append the audio in slices, encoding each one just before it is sent, so the
+    # whole file is never held as one large base64 string next to the raw bytes
+    audio_view = memoryview(audio_data)
+    for offset in range(0, len(audio_view), AUDIO_APPEND_CHUNK_SIZE):
+        audio = b64encode_str(audio_view[offset:offset + AUDIO_APPEND_CHUNK_SIZE])
+        await websocket.send(_APPEND_MESSAGE_PREFIX + audio + _APPEND_MESSAGE_SUFFIX)
+
+# Seconds to wait for the session.created event before sending audio
+SESSION_READY_TIMEOUT = 10.0
+
+async def wait_for_session(event: asyncio.Event, listen_task: asyncio.Task) -> bool:
+    """Wait for session.created; on timeout, stop the listener and return False."""
+    try:
+        await asyncio.wait_for(event.wait(), timeout=SESSION_READY_TIMEOUT)
+        return True
+    except asyncio.TimeoutError:
+        print(f"Error: session not created within {SESSION_READY_TIMEOUT:g}s")
+        # Stop the listener before the caller closes, so it isn't left waiting on the socket
+        listen_task.cancel()
+        await asyncio.gather(listen_task, return_exceptions=True)
+        return False
+
+class OpenAIRealtimeBase:
+    """Connection state and receive loop shared by the Realtime API test scripts.
+
+    Subclasses set _EVENT_HANDLERS, mapping server event types to async handlers
+    called with the parsed event; a handler returns True to stop listening.
+    """
+    _EVENT_HANDLERS = {}
+    
+    def __init__(self, api_key: str, caller_language: str):
+        self.api_key = api_key
+        self.caller_language = caller_language
+        self.websocket = None
+        self.audio_data = bytearray()
+        self.audio_delta_count = 0
+        self.session_created = asyncio.Event()
+    
+    async def listen_for_responses(self):
+        """Listen for responses from OpenAI and collect audio chunks."""
+        print("Listening for responses...")
+        
+        while True:
+            try:
+                # Take the raw frame bytes; the JSON parser decodes them itself, so
+                # websockets doesn't need to build a str first
+                message = await asyncio.wait_for(self.websocket.recv(decode=False), timeout=30.0)
+                data = loads_message(message)
+                event_type = data.get('type')
+                
+                # Audio deltas arrive at a high rate, so collect them without logging
+                # each one; a summary is printed when the audio response completes
+                if event_type == 'response.audio.delta':
+                    # Decode audio chunks as they arrive and collect the raw bytes
+                    if 'delta' in data:
+                        self.audio_data += base64.b64decode(data['delta'], validate=False)
+                        self.audio_delta_count += 1
+                    continue
+                
+                print(f"Received message type: {event_type}")
+                
+                handler = self._EVENT_HANDLERS.get(event_type)
+                if handler is not None and await handler(self, data):
+                    break
+                    
+            except asyncio.TimeoutError:
+                print("Timeout waiting for response")
+                break
+            except Exception as e:
+                print(f"Error receiving message: {e}")
+                break
+    
+    # Handlers for the server events both scripts treat the same way
+    async def _on_session_created(self, data):
+        print("Session created successfully")
+        self.session_created.set()
+    
+    async def _on_session_updated(self, data):
+        print("Session updated successfully")
+    
+    async def _on_error(self, data):
+        print(f"Error received: {data}")
+        return True
+
+async def mp3_to_g711_ulaw(input_file: str) -> bytes:
+    """Convert an MP3 file to raw G.711 μ-law samples."""
+    # Let ffmpeg write the μ-law stream to stdout instead of a temporary file.
+    # The API expects headerless samples, so use the raw mulaw muxer rather
+    # than a WAV container.
+    audio_data, _ = await run_ffmpeg(
+        ffmpeg
+        .input(input_file)
+        .output('pipe:', ar=8000, ac=1, f='mulaw', threads=FFMPEG_THREADS),
+        capture_stdout=True, quiet=True
+    )
+    return audio_data
+
+def _g711_ulaw_input(enhance: bool = True):
+    """Read raw G.711 μ-law from stdin, cleaned up for playback when enhance is set."""
+    stream = ffmpeg.input('pipe:', f='mulaw', ar=8000, ac=1)
+    if not enhance:
+        return stream
+    return (
+        stream
+        .filter('volume', '1.5')  # Boost volume slightly
+        .filter('highpass', f=80)  # Remove low-frequency noise
+        .filter('lowpass', f=3400)  # Remove high-frequency noise (G.711 bandwidth limit)
+    )
+
+# Plain 8 kHz encode, for checking the conversion itself rather than how it sounds
+_PLAIN_MP3_OPTIONS = {'ar': 8000}
+
+# Enhanced encode used for the translated audio
+_ENHANCED_MP3_OPTIONS = {
+    'ar': 22050,  # Upsample for better quality (but not too high to avoid artifacts)
+    'audio_bitrate': '128k',  # Good bitrate for speech
+    'q': '2'  # High quality setting for LAME
+}
+
+async def g711_ulaw_to_mp3(audio_data: bytes, output_file: str, enhance: bool = True) -> bytes:
+    """Convert raw G.711 μ-law audio to MP3.
+
+    Pass 'pipe:' as output_file to get the MP3 data back instead of writing a file.
+    With enhance=False the audio is encoded as is at 8 kHz, without the filters
+    and upsampling applied to the translated audio.
+    """
+    # Convert raw G.711 μ-law to MP3, feeding the audio to a single ffmpeg
+    # process through stdin
+    # By default, apply audio filters to improve quality and upsample for better output
+    mp3_data, _ = await run_ffmpeg(
+        _g711_ulaw_input(enhance)
+        .output(
+            output_file,
+            f='mp3',  # Needed when writing to a pipe, where there is no extension
+            acodec='libmp3lame',  # Use LAME encoder for better quality
+            ac=1,  # Mono
+            threads=FFMPEG_THREADS,
+            **(_ENHANCED_MP3_OPTIONS if enhance else _PLAIN_MP3_OPTIONS)
+        )
+        .overwrite_output(),
+        input=audio_data, capture_stdout=True, capture_stderr=True
+    )
+    return mp3_data
+
+def g711_ulaw_wav_header(data_size: int) -> bytes:
+    """Build the 44-byte RIFF header for mono 8 kHz G.711 μ-law audio."""
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16,
+        7,  # WAVE_FORMAT_MULAW
+        1,  # Mono
+        8000,  # Sample rate
+        8000,  # Byte rate: one byte per sample
+        1,  # Block align
+        8,  # Bits per sample
+        b'data', data_size
+    )
+
+def write_g711_ulaw_wav(audio_data: bytes, output_file: str):
+    """Wrap raw G.711 μ-law audio in a WAV container without running ffmpeg."""
+    with open(output_file, 'wb') as f:
+        f.write(g711_ulaw_wav_header(len(audio_data)))
+        f.write(audio_data)
+
+def print_ffmpeg_error(e: ffmpeg.Error):
+    """Print the output ffmpeg produced before failing."""
+    print(f"FFmpeg stdout: {e.stdout.decode() if e.stdout else 'None'}")
+    print(f"FFmpeg stderr: {e.stderr.decode() if e.stderr else 'None'}")
@@ -5,15 +5,39 @@ Converts python_tests/test/agent.mp3 to g711_ulaw format, sends it to OpenAI for
 and saves the result as python_tests/test/agent_translated.mp3.
 """
 
+import argparse
 import asyncio
-import websockets
-import json
-import base64
 import os
-import tempfile
 import ffmpeg
 from pathlib import Path
 
+from realtime_io import (
+    BASE64_BACKEND,
+    INPUT_AUDIO_COMMIT_MESSAGE,
+    OpenAIRealtimeBase,
+    append_audio,
+    build_prompt,
+    connect_realtime,
+    dumps_message,
+    g711_ulaw_to_mp3,
+    mp3_to_g711_ulaw,
+    print_ffmpeg_error,
+    run,
+    split_prompt,
+    wait_for_session,
+    write_g711_ulaw_wav,
+)
+
+# Manually create a response since we disabled turn detection; the event never
+# changes, so it is serialized once at import
+RESPONSE_CREATE_MESSAGE = dumps_message({
+    'type': 'response.create',
+    'response': {
+        'modalities': ['text', 'audio'],
+        'instructions': 'Translate the audio to Danish and respond with audio only.'
+    }
+})
+
 # AI_PROMPT_AGENT from src/prompts.ts
 AI_PROMPT_AGENT = """
 You are a translation machine. Your sole function is to translate the input text from English to [CALLER_LANGUAGE].
@@ -28,85 +52,47 @@ User: I have two brothers and one sister in my family.
 Assistant: Tengo dos hermanos y una hermana en mi familia.
 """
 
-class OpenAIRealtimeTest:
+_PROMPT_PARTS = split_prompt(AI_PROMPT_AGENT)
+
+class OpenAIRealtimeTest(OpenAIRealtimeBase):
     def __init__(self, api_key: str, caller_language: str = "Danish"):
-        self.api_key = api_key
-        self.caller_language = caller_language
-        self.websocket = None
-        self.audio_chunks = []
-        self.session_ready = False
+        super().__init__(api_key, caller_language)
         
-    async def convert_mp3_to_g711_ulaw(self, input_file: str, output_file: str):
-        """Convert MP3 file to G.711 μ-law format."""
+    async def convert_mp3_to_g711_ulaw(self, input_file: str) -> bytes:
+        """Convert MP3 file to G.711 μ-law format and return the encoded audio."""
         try:
-            (
-                ffmpeg
-                .input(input_file)
-                .output(output_file, acodec='pcm_mulaw', ar=8000, ac=1, f='wav')
-                .overwrite_output()
-                .run(quiet=True)
-            )
-            print(f"Converted {input_file} to G.711 μ-law format: {output_file}")
+            audio_data = await mp3_to_g711_ulaw(input_file)
+            print(f"Converted {input_file} to G.711 μ-law format ({len(audio_data)} bytes)")
+            return audio_data
         except ffmpeg.Error as e:
             print(f"Error converting audio: {e}")
             raise
     
-    async def convert_g711_ulaw_to_mp3(self, input_file: str, output_file: str):
-        """Convert raw G.711 μ-law format back to MP3."""
+    async def convert_g711_ulaw_to_mp3(self, audio_data: bytes, output_file: str):
+        """Convert raw G.711 μ-law audio back to MP3."""
         try:
-            # First, let's try to probe the file
-            try:
-                probe = ffmpeg.probe(input_file)
-                print(f"Input file info: {probe}")
-            except:
-                print("Could not probe raw audio file - treating as G.711 μ-law")
-            
-            # Convert raw G.711 μ-law to MP3 with enhanced quality
-            # Apply audio filters to improve quality and upsample for better output
-            (
-                ffmpeg
-                .input(input_file, f='mulaw', ar=8000, ac=1)
-                .filter('volume', '1.5')  # Boost volume slightly
-                .filter('highpass', f=80)  # Remove low-frequency noise
-                .filter('lowpass', f=3400)  # Remove high-frequency noise (G.711 bandwidth limit)
-                .output(
-                    output_file, 
-                    acodec='libmp3lame',  # Use LAME encoder for better quality
-                    ar=22050,  # Upsample for better quality (but not too high to avoid artifacts)
-                    ac=1,  # Mono
-                    audio_bitrate='128k',  # Good bitrate for speech
-                    q='2'  # High quality setting for LAME
-                )
-                .overwrite_output()
-                .run(capture_stdout=True, capture_stderr=True)
-            )
+            await g711_ulaw_to_mp3(audio_data, output_file)
             print(f"Converted G.711 μ-law to MP3: {output_file}")
         except ffmpeg.Error as e:
             print(f"Error converting audio: {e}")
-            print(f"FFmpeg stdout: {e.stdout.decode() if e.stdout else 'None'}")
-            print(f"FFmpeg stderr: {e.stderr.decode() if e.stderr else 'None'}")
+            print_ffmpeg_error(e)
             raise
     
-    def read_audio_file_as_base64(self, file_path: str) -> str:
-        """Read audio file and encode as base64."""
-        with open(file_path, 'rb') as f:
-            audio_data = f.read()
-        return base64.b64encode(audio_data).decode('utf-8')
+    def save_g711_ulaw_wav(self, audio_data: bytes, output_file: str):
+        """Save raw G.711 μ-law audio as WAV, skipping ffmpeg and the MP3 encode."""
+        write_g711_ulaw_wav(audio_data, output_file)
+        print(f"Saved G.711 μ-law as WAV: {output_file}")
     
     async def connect_to_openai(self):
         """Establish WebSocket connection to OpenAI Realtime API."""
         url = 'wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2024-12-17'
-        headers = [
-            ('Authorization', f'Bearer {self.api_key}'),
-            ('OpenAI-Beta', 'realtime=v1')
-        ]
         
         print("Connecting to OpenAI Realtime API...")
-        self.websocket = await websockets.connect(url, additional_headers=headers)
+        self.websocket = await connect_realtime(url, self.api_key)
         print("Connected successfully!")
         
         # Configure the session
-        agent_prompt = AI_PROMPT_AGENT.replace('[CALLER_LANGUAGE]', self.caller_language)
+        agent_prompt = build_prompt(_PROMPT_PARTS, self.caller_language)
         
         session_config = {
             'type': 'session.update',
@@ -120,129 +106,68 @@ class OpenAIRealtimeTest:
             }
         }
         
-        await self.websocket.send(json.dumps(session_config))
+        await self.websocket.send(dumps_message(session_config))
         print("Session configured with Danish translation prompt")
         
-    async def send_audio_data(self, audio_base64: str):
+    async def send_audio_data(self, audio_data: bytes):
         """Send audio data to OpenAI for translation."""
-        message = {
-            'type': 'input_audio_buffer.append',
-            'audio': audio_base64
-        }
+        await append_audio(self.websocket, audio_data)
+        print(f"Audio data sent to OpenAI (encoded with {BASE64_BACKEND})")
         
-        await self.websocket.send(json.dumps(message))
-        print("Audio data sent to OpenAI")
-        
-        # Commit the audio buffer to trigger processing
-        commit_message = {
-            'type': 'input_audio_buffer.commit'
-        }
-        await self.websocket.send(json.dumps(commit_message))
+        # The API takes one event per message, so send the pre-serialized commit and
+        # response.create events back to back without any other work in between
+        for control_message in (INPUT_AUDIO_COMMIT_MESSAGE, RESPONSE_CREATE_MESSAGE):
+            await self.websocket.send(control_message)
         print("Audio buffer committed")
-        
-        # Manually create a response since we disabled turn detection
-        response_message = {
-            'type': 'response.create',
-            'response': {
-                'modalities': ['text', 'audio'],
-                'instructions': 'Translate the audio to Danish and respond with audio only.'
-            }
-        }
-        await self.websocket.send(json.dumps(response_message))
         print("Response creation requested")
     
-    async def listen_for_responses(self):
-        """Listen for responses from OpenAI and collect audio chunks."""
-        print("Listening for responses...")
-        
-        while True:
-            try:
-                message = await asyncio.wait_for(self.websocket.recv(), timeout=30.0)
-                data = json.loads(message)
-                
-                print(f"Received message type: {data.get('type')}")
-                
-                if data.get('type') == 'session.created':
-                    print("Session created successfully")
-                    self.session_ready = True
-                
-                elif data.get('type') == 'session.updated':
-                    print("Session updated successfully")
-                
-                elif data.get('type') == 'input_audio_buffer.speech_started':
-                    print("Speech detection started")
-                
-                elif data.get('type') == 'input_audio_buffer.speech_stopped':
-                    print("Speech detection stopped")
-                
-                elif data.get('type') == 'response.created':
-                    print("Response creation started")
-                
-                elif data.get('type') == 'response.audio.delta':
-                    # Collect audio chunks
-                    if 'delta' in data:
-                        self.audio_chunks.append(data['delta'])
-                        print(f"Received audio chunk ({len(data['delta'])} chars)")
-                
-                elif data.get('type') == 'response.audio.done':
-                    print("Audio response completed")
-                    break
-                
-                elif data.get('type') == 'response.done':
-                    print("Response completed")
-                    break
-                
-                elif data.get('type') == 'error':
-                    print(f"Error received: {data}")
-                    break
-                    
-            except asyncio.TimeoutError:
-                print("Timeout waiting for response")
-                break
-            except Exception as e:
-                print(f"Error receiving message: {e}")
-                break
+    # Handlers for the server events specific to this script; a handler returns
+    # True to stop listening
+    async def _on_speech_started(self, data):
+        print("Speech detection started")
+    
+    async def _on_speech_stopped(self, data):
+        print("Speech detection stopped")
+    
+    async def _on_response_created(self, data):
+        print("Response creation started")
+    
+    async def _on_audio_done(self, data):
+        print(f"Audio response completed ({self.audio_delta_count} chunks, {len(self.audio_data)} bytes)")
+        return True
+    
+    async def _on_response_done(self, data):
+        print("Response completed")
+        return True
     
-    async def save_translated_audio(self, output_file: str):
-        """Save the collected audio chunks to a file."""
-        if not self.audio_chunks:
+    _EVENT_HANDLERS = {
+        'session.created': OpenAIRealtimeBase._on_session_created,
+        'session.updated': OpenAIRealtimeBase._on_session_updated,
+        'input_audio_buffer.speech_started': _on_speech_started,
+        'input_audio_buffer.speech_stopped': _on_speech_stopped,
+        'response.created': _on_response_created,
+        'response.audio.done': _on_audio_done,
+        'response.done': _on_response_done,
+        'error': OpenAIRealtimeBase._on_error,
+    }
+    
+    async def save_translated_audio(self, output_file: str, fast: bool = False):
+        """Save the collected audio to a file, as WAV instead of MP3 when fast is set."""
+        if not self.audio_data:
             print("No audio chunks received")
             return False
         
-        print(f"Combining {len(self.audio_chunks)} audio chunks...")
-        
-        # Decode each chunk individually and combine the raw audio bytes
-        audio_data = b''
-        for i, chunk in enumerate(self.audio_chunks):
-            try:
-                chunk_data = base64.b64decode(chunk)
-                audio_data += chunk_data
-                print(f"Chunk {i+1}: {len(chunk)} chars -> {len(chunk_data)} bytes")
-            except Exception as e:
-                print(f"Error decoding chunk {i+1}: {e}")
-                return False
-        
-        print(f"Total decoded audio data: {len(audio_data)} bytes")
-        print(f"First 20 bytes: {audio_data[:20].hex()}")
-        
-        if len(audio_data) == 0:
-            print("No audio data after decoding chunks")
-            return False
-        
-        # Save to temporary raw audio file
-        with tempfile.NamedTemporaryFile(suffix='.raw', delete=False) as temp_file:
-            temp_file.write(audio_data)
-            temp_g711_file = temp_file.name
-            print(f"Saved raw audio data to: {temp_g711_file}")
+        print(f"Total decoded audio data: {len(self.audio_data)} bytes")
+        print(f"First 20 bytes: {self.audio_data[:20].hex()}")
         
-        try:
-            # Convert raw G.711 μ-law to MP3
-            await self.convert_g711_ulaw_to_mp3(temp_g711_file, output_file)
-            print(f"Translated audio saved to: {output_file}")
-            return True
-        finally:
-            # Clean up temporary file
-            os.unlink(temp_g711_file)
+        # Convert raw G.711 μ-law to MP3, or wrap it in a WAV header without the costly
+        # MP3 encode
+        if fast:
+            self.save_g711_ulaw_wav(self.audio_data, output_file)
+        else:
+            await self.convert_g711_ulaw_to_mp3(self.audio_data, output_file)
+        print(f"Translated audio saved to: {output_file}")
+        return True
     
     async def close_connection(self):
         """Close the WebSocket connection."""
@@ -250,7 +175,7 @@ class OpenAIRealtimeTest:
             await self.websocket.close()
             print("Connection closed")
 
-async def main():
+async def main(fast: bool = False):
     # Check for OpenAI API key
     api_key = os.getenv('OPENAI_API_KEY')
     if not api_key:
@@ -260,7 +185,7 @@ async def main():
     
     # File paths
     input_file = 'test/agent.mp3'
-    output_file = 'test/agent_translated.mp3'
+    output_file = 'test/agent_translated.wav' if fast else 'test/agent_translated.mp3'
     
     # Check if input file exists
     if not os.path.exists(input_file):
@@ -271,33 +196,27 @@ async def main():
     test = OpenAIRealtimeTest(api_key, caller_language="Danish")
     
     try:
-        # Convert MP3 to G.711 μ-law format
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-            temp_g711_file = temp_file.name
-        
-        await test.convert_mp3_to_g711_ulaw(input_file, temp_g711_file)
-        
-        # Read audio file as base64
-        audio_base64 = test.read_audio_file_as_base64(temp_g711_file)
-        print(f"Audio file loaded ({len(audio_base64)} chars)")
-        
-        # Connect to OpenAI
-        await test.connect_to_openai()
-        
-        # Wait for session to be ready
-        await asyncio.sleep(1)
+        # Convert MP3 to G.711 μ-law format while connecting to OpenAI
+        audio_data, _ = await asyncio.gather(
+            test.convert_mp3_to_g711_ulaw(input_file),
+            test.connect_to_openai()
+        )
         
         # Start listening for responses in the background
         listen_task = asyncio.create_task(test.listen_for_responses())
         
+        # Wait for session to be ready
+        if not await wait_for_session(test.session_created, listen_task):
+            return
+        
         # Send audio data
-        await test.send_audio_data(audio_base64)
+        await test.send_audio_data(audio_data)
         
         # Wait for responses
         await listen_task
         
         # Save translated audio
-        success = await test.save_translated_audio(output_file)
+        success = await test.save_translated_audio(output_file, fast=fast)
         
         if success:
             print(f"\n✅ Translation completed successfully!")
@@ -310,12 +229,11 @@ async def main():
         print(f"Error during translation: {e}")
     finally:
         # Clean up
-        if 'temp_g711_file' in locals():
-            try:
-                os.unlink(temp_g711_file)
-            except:
-                pass
         await test.close_connection()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Test OpenAI Realtime API translation.")
+    parser.add_argument('--fast', action='store_true',
+                        help="save the translation as μ-law WAV instead of MP3; skips the ffmpeg MP3 encode")
+    args = parser.parse_args()
+    run(main(fast=args.fast))
\ No newline at end of file
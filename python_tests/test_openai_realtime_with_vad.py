@@ -5,62 +5,76 @@ This version uses the same turn detection settings as the TypeScript implementat
 """
 
 import asyncio
-import json
+import mmap
 import os
-import base64
-import tempfile
-import websockets
+import re
 import ffmpeg
+from functools import lru_cache
+
+from realtime_io import (
+    BASE64_BACKEND,
+    INPUT_AUDIO_COMMIT_MESSAGE,
+    OpenAIRealtimeBase,
+    append_audio,
+    build_prompt,
+    connect_realtime,
+    dumps_message,
+    g711_ulaw_to_mp3,
+    mp3_to_g711_ulaw,
+    print_ffmpeg_error,
+    run,
+    split_prompt,
+    wait_for_session,
+)
+
+# Matches the AI_PROMPT_AGENT export in prompts.ts, capturing the template literal
+AI_PROMPT_AGENT_PATTERN = re.compile(rb"export const AI_PROMPT_AGENT = `(.*?)`;", re.DOTALL)
 
 # Import the AI_PROMPT_AGENT from the TypeScript file
+@lru_cache(maxsize=None)
 def get_ai_prompt_agent():
     """Extract AI_PROMPT_AGENT from the TypeScript prompts file."""
     try:
-        with open('../src/prompts.ts', 'r') as f:
-            content = f.read()
+        # Scan the mapped bytes and only decode the prompt itself
+        with open('../src/prompts.ts', 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            match = AI_PROMPT_AGENT_PATTERN.search(content)
+            if match is None:
+                raise ValueError("AI_PROMPT_AGENT not found in prompts.ts")
             
-        # Find the AI_PROMPT_AGENT export
-        start_marker = "export const AI_PROMPT_AGENT = `"
-        end_marker = "`;"
-        
-        start_idx = content.find(start_marker)
-        if start_idx == -1:
-            raise ValueError("AI_PROMPT_AGENT not found in prompts.ts")
-        
-        start_idx += len(start_marker)
-        end_idx = content.find(end_marker, start_idx)
-        if end_idx == -1:
-            raise ValueError("End of AI_PROMPT_AGENT not found in prompts.ts")
-        
-        return content[start_idx:end_idx]
+            return match.group(1).decode('utf-8')
     except Exception as e:
         print(f"Error reading AI_PROMPT_AGENT: {e}")
         return "You are a helpful translation assistant. Translate the audio to Danish."
 
 AI_PROMPT_AGENT = get_ai_prompt_agent()
 
-class OpenAIRealtimeTranslator:
+_PROMPT_PARTS = split_prompt(AI_PROMPT_AGENT)
+
+# The response.create event never changes, so it is serialized once at import
+RESPONSE_CREATE_MESSAGE = dumps_message({
+    'type': 'response.create',
+    'response': {
+        'modalities': ['text', 'audio'],
+        'instructions': 'Translate the provided audio to Danish. Respond only with the translation in audio format.'
+    }
+})
+
+class OpenAIRealtimeTranslator(OpenAIRealtimeBase):
     def __init__(self, api_key: str, caller_language: str = "English"):
-        self.api_key = api_key
-        self.caller_language = caller_language
-        self.websocket = None
-        self.audio_chunks = []
-        self.session_ready = False
+        super().__init__(api_key, caller_language)
+        self.response_started = False
         
     async def connect(self):
         """Connect to OpenAI Realtime API."""
         url = "wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2024-10-01"
-        headers = [
-            ('Authorization', f'Bearer {self.api_key}'),
-            ('OpenAI-Beta', 'realtime=v1')
-        ]
         
         print("Connecting to OpenAI Realtime API...")
-        self.websocket = await websockets.connect(url, additional_headers=headers)
+        self.websocket = await connect_realtime(url, self.api_key)
         print("Connected successfully!")
         
         # Configure the session with server VAD (same as TypeScript)
-        agent_prompt = AI_PROMPT_AGENT.replace('[CALLER_LANGUAGE]', self.caller_language)
+        agent_prompt = build_prompt(_PROMPT_PARTS, self.caller_language)
         
         session_config = {
             'type': 'session.update',
@@ -74,214 +88,100 @@ class OpenAIRealtimeTranslator:
             }
         }
         
-        await self.websocket.send(json.dumps(session_config))
+        await self.websocket.send(dumps_message(session_config))
         print("Session configured with Danish translation prompt")
         
-    async def send_audio_data(self, audio_base64: str):
+    async def send_audio_data(self, audio_data: bytes):
         """Send audio data to OpenAI for translation with server VAD."""
         print("Sending audio data for server VAD processing...")
         
-        # Send all audio at once (like the working main script)
-        # The chunked approach was causing multiple speech detection events
-        message = {
-            'type': 'input_audio_buffer.append',
-            'audio': audio_base64
-        }
-        
-        await self.websocket.send(json.dumps(message))
-        print("Audio data sent to OpenAI")
+        # Turn detection is disabled for the session, so appending the audio in
+        # slices (like the main script) can't split it into several speech events
+        await append_audio(self.websocket, audio_data)
+        print(f"Audio data sent to OpenAI (encoded with {BASE64_BACKEND})")
         
         # Wait a moment for all audio to be processed
         await asyncio.sleep(1.0)
         
         # Manually commit the buffer to ensure all audio is processed
-        commit_message = {
-            'type': 'input_audio_buffer.commit'
-        }
-        await self.websocket.send(json.dumps(commit_message))
+        await self.websocket.send(INPUT_AUDIO_COMMIT_MESSAGE)
         print("Audio buffer committed manually - waiting for all speech detection to complete...")
         
     async def listen_for_responses(self):
         """Listen for responses from OpenAI and collect audio chunks."""
-        print("Listening for responses...")
-        
-        response_started = False
-        buffer_committed = False
-        
-        while True:
-            try:
-                message = await asyncio.wait_for(self.websocket.recv(), timeout=30.0)
-                data = json.loads(message)
-                
-                print(f"Received message type: {data.get('type')}")
-                
-                if data.get('type') == 'session.created':
-                    print("Session created successfully")
-                    self.session_ready = True
-                
-                elif data.get('type') == 'session.updated':
-                    print("Session updated successfully")
-                
-                elif data.get('type') == 'input_audio_buffer.committed':
-                    print("Audio buffer committed")
-                    buffer_committed = True
-                    
-                    # Create response immediately after buffer is committed (like main script)
-                    if not response_started:
-                        print("Creating response for translation...")
-                        response_message = {
-                            'type': 'response.create',
-                            'response': {
-                                'modalities': ['text', 'audio'],
-                                'instructions': 'Translate the provided audio to Danish. Respond only with the translation in audio format.'
-                            }
-                        }
-                        await self.websocket.send(json.dumps(response_message))
-                
-                elif data.get('type') == 'conversation.item.created':
-                    print("Conversation item created")
-                
-                elif data.get('type') == 'response.created':
-                    print("Response creation started")
-                    response_started = True
-                
-                elif data.get('type') == 'response.audio.delta':
-                    # Collect audio chunks
-                    if 'delta' in data:
-                        self.audio_chunks.append(data['delta'])
-                        print(f"Received audio chunk ({len(data['delta'])} chars)")
-                
-                elif data.get('type') == 'response.audio.done':
-                    print("Audio response completed")
-                    if response_started:
-                        break
-                
-                elif data.get('type') == 'response.done':
-                    print("Response completed")
-                    if response_started:
-                        break
-                
-                elif data.get('type') == 'error':
-                    print(f"Error received: {data}")
-                    break
-                    
-            except asyncio.TimeoutError:
-                print("Timeout waiting for response")
-                break
-            except Exception as e:
-                print(f"Error receiving message: {e}")
-                break
+        self.response_started = False
+        await super().listen_for_responses()
+    
+    # Handlers for the server events specific to this script; a handler returns
+    # True to stop listening
+    async def _on_buffer_committed(self, data):
+        print("Audio buffer committed")
+        
+        # Create response immediately after buffer is committed (like main script)
+        if not self.response_started:
+            print("Creating response for translation...")
+            await self.websocket.send(RESPONSE_CREATE_MESSAGE)
+    
+    async def _on_item_created(self, data):
+        print("Conversation item created")
+    
+    async def _on_response_created(self, data):
+        print("Response creation started")
+        self.response_started = True
+    
+    async def _on_audio_done(self, data):
+        print(f"Audio response completed ({self.audio_delta_count} chunks, {len(self.audio_data)} bytes)")
+        return self.response_started
+    
+    async def _on_response_done(self, data):
+        print("Response completed")
+        return self.response_started
+    
+    _EVENT_HANDLERS = {
+        'session.created': OpenAIRealtimeBase._on_session_created,
+        'session.updated': OpenAIRealtimeBase._on_session_updated,
+        'input_audio_buffer.committed': _on_buffer_committed,
+        'conversation.item.created': _on_item_created,
+        'response.created': _on_response_created,
+        'response.audio.done': _on_audio_done,
+        'response.done': _on_response_done,
+        'error': OpenAIRealtimeBase._on_error,
+    }
     
     async def close(self):
         """Close the WebSocket connection."""
         if self.websocket:
             await self.websocket.close()
 
-def convert_mp3_to_g711_ulaw(input_file: str) -> str:
-    """Convert MP3 file to G.711 μ-law format and return as base64."""
-    with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-        temp_path = temp_file.name
-    
-    try:
-        # Convert MP3 to G.711 μ-law WAV
-        (
-            ffmpeg
-            .input(input_file)
-            .output(temp_path, acodec='pcm_mulaw', ar=8000, ac=1, f='wav')
-            .overwrite_output()
-            .run(quiet=True)
-        )
-        
-        print(f"Converted {input_file} to G.711 μ-law format: {temp_path}")
-        
-        # Read the converted file and encode as base64
-        with open(temp_path, 'rb') as f:
-            audio_data = f.read()
-        
-        return base64.b64encode(audio_data).decode('utf-8')
-    
-    finally:
-        # Clean up temporary file
-        if os.path.exists(temp_path):
-            os.unlink(temp_path)
+async def convert_mp3_to_g711_ulaw(input_file: str) -> bytes:
+    """Convert MP3 file to G.711 μ-law format and return the encoded audio."""
+    # ffmpeg writes the raw μ-law samples to a pipe, so no temporary file is needed
+    audio_data = await mp3_to_g711_ulaw(input_file)
+    print(f"Converted {input_file} to G.711 μ-law format ({len(audio_data)} bytes)")
+    return audio_data
 
-def save_audio_chunks_as_mp3(audio_chunks: list, output_file: str):
-    """Convert base64 audio chunks back to MP3 format."""
-    if not audio_chunks:
-        print("No audio chunks to save")
+async def save_audio_as_mp3(audio_data: bytes, output_file: str):
+    """Convert raw G.711 μ-law audio back to MP3 format."""
+    if not audio_data:
+        print("No audio data to save")
         return False
     
-    print(f"Combining {len(audio_chunks)} audio chunks...")
-    
-    # Decode each chunk individually and combine the raw audio bytes
-    audio_data = b''
-    for i, chunk in enumerate(audio_chunks):
-        try:
-            chunk_data = base64.b64decode(chunk)
-            audio_data += chunk_data
-            print(f"Chunk {i+1}: {len(chunk)} chars -> {len(chunk_data)} bytes")
-        except Exception as e:
-            print(f"Error decoding chunk {i+1}: {e}")
-            return False
-    
     print(f"Total decoded audio data: {len(audio_data)} bytes")
     print(f"First 20 bytes: {audio_data[:20].hex()}")
     
-    if len(audio_data) == 0:
-        print("No audio data after decoding chunks")
-        return False
-    
-    # Save as temporary raw audio file first
-    with tempfile.NamedTemporaryFile(suffix='.raw', delete=False) as temp_file:
-        temp_path = temp_file.name
-        temp_file.write(audio_data)
-    
-    print(f"Saved raw audio data to: {temp_path}")
-    
     try:
-        # First, let's check what format the raw audio is in
-        try:
-            probe = ffmpeg.probe(temp_path)
-            print(f"Raw audio file info: {probe}")
-        except:
-            print("Could not probe raw audio file - treating as G.711 μ-law")
-        
-        # Convert raw G.711 μ-law to MP3 with enhanced quality
-        # Apply audio filters to improve quality and upsample for better output
-        (
-            ffmpeg
-            .input(temp_path, f='mulaw', ar=8000, ac=1)
-            .filter('volume', '1.5')  # Boost volume slightly
-            .filter('highpass', f=80)  # Remove low-frequency noise
-            .filter('lowpass', f=3400)  # Remove high-frequency noise (G.711 bandwidth limit)
-            .output(
-                output_file, 
-                acodec='libmp3lame',  # Use LAME encoder for better quality
-                ar=22050,  # Upsample for better quality (but not too high to avoid artifacts)
-                ac=1,  # Mono
-                audio_bitrate='128k',  # Good bitrate for speech
-                q='2'  # High quality setting for LAME
-            )
-            .overwrite_output()
-            .run(capture_stdout=True, capture_stderr=True)
-        )
+        await g711_ulaw_to_mp3(audio_data, output_file)
         
         print(f"Saved translated audio as: {output_file}")
         return True
     
     except ffmpeg.Error as e:
         print(f"Error converting audio to MP3: {e}")
-        print(f"FFmpeg stdout: {e.stdout.decode() if e.stdout else 'None'}")
-        print(f"FFmpeg stderr: {e.stderr.decode() if e.stderr else 'None'}")
+        print_ffmpeg_error(e)
         return False
     except Exception as e:
         print(f"Unexpected error converting audio: {e}")
         return False
-    
-    finally:
-        # Clean up temporary file
-        if os.path.exists(temp_path):
-            os.unlink(temp_path)
 
 async def main():
     """Main function to test OpenAI Realtime API translation."""
@@ -302,32 +202,37 @@ async def main():
         return
     
     try:
-        # Convert audio to G.711 μ-law format
-        audio_base64 = convert_mp3_to_g711_ulaw(input_file)
-        print(f"Audio file loaded ({len(audio_base64)} chars)")
-        
         # Create translator instance
         translator = OpenAIRealtimeTranslator(api_key, caller_language="English")
         
-        # Connect to OpenAI
-        await translator.connect()
+        # Convert audio to G.711 μ-law format while connecting to OpenAI; the
+        # conversion runs on the ffmpeg worker thread, so the handshake isn't blocked
+        audio_data, _ = await asyncio.gather(
+            convert_mp3_to_g711_ulaw(input_file),
+            translator.connect()
+        )
+        
+        # Start listening for responses in the background
+        listen_task = asyncio.create_task(translator.listen_for_responses())
         
         # Wait for session to be ready
-        await asyncio.sleep(1)
+        if not await wait_for_session(translator.session_created, listen_task):
+            await translator.close()
+            return
         
         # Send audio data
-        await translator.send_audio_data(audio_base64)
+        await translator.send_audio_data(audio_data)
         
-        # Listen for responses
-        await translator.listen_for_responses()
+        # Wait for responses
+        await listen_task
         
         # Close connection
         await translator.close()
         print("Connection closed")
         
         # Save translated audio
-        if translator.audio_chunks:
-            success = save_audio_chunks_as_mp3(translator.audio_chunks, output_file)
+        if translator.audio_data:
+            success = await save_audio_as_mp3(translator.audio_data, output_file)
             if success:
                 print(f"✅ Translation completed successfully!")
                 print(f"Original: {input_file}")
@@ -341,4 +246,4 @@ async def main():
         print(f"❌ Error during translation: {e}")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    run(main())
\ No newline at end of file
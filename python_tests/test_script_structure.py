@@ -4,8 +4,16 @@ Test script to verify the OpenAI Realtime API test structure without requiring a
 """
 
 import asyncio
-import tempfile
+import base64
+import json
 import os
+from realtime_io import (
+    AUDIO_APPEND_CHUNK_SIZE,
+    _APPEND_MESSAGE_PREFIX,
+    _APPEND_MESSAGE_SUFFIX,
+    b64encode_str,
+    g711_ulaw_to_mp3,
+)
 from test_openai_realtime import OpenAIRealtimeTest
 
 async def test_audio_conversion():
@@ -27,30 +35,18 @@ async def test_audio_conversion():
     
     # Test audio conversion
     try:
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-            temp_g711_file = temp_file.name
-        
         print("🔄 Testing MP3 to G.711 μ-law conversion...")
-        await test.convert_mp3_to_g711_ulaw(input_file, temp_g711_file)
+        audio_data = await test.convert_mp3_to_g711_ulaw(input_file)
         
-        if os.path.exists(temp_g711_file):
-            print("✅ Audio conversion successful")
-            
-            # Test base64 encoding
-            print("🔄 Testing base64 encoding...")
-            audio_base64 = test.read_audio_file_as_base64(temp_g711_file)
-            print(f"✅ Base64 encoding successful ({len(audio_base64)} chars)")
+        if audio_data:
+            print(f"✅ Audio conversion successful ({len(audio_data)} bytes)")
             
-            # Test reverse conversion
+            # Test reverse conversion, keeping the MP3 in memory
             print("🔄 Testing G.711 μ-law to MP3 conversion...")
-            with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as output_temp:
-                output_file = output_temp.name
+            mp3_data = await g711_ulaw_to_mp3(audio_data, 'pipe:')
             
-            await test.convert_g711_ulaw_to_mp3(temp_g711_file, output_file)
-            
-            if os.path.exists(output_file):
-                print("✅ Reverse conversion successful")
-                os.unlink(output_file)
+            if mp3_data:
+                print(f"✅ Reverse conversion successful ({len(mp3_data)} bytes)")
             else:
                 print("❌ Reverse conversion failed")
                 return False
@@ -62,13 +58,33 @@ async def test_audio_conversion():
     except Exception as e:
         print(f"❌ Error during audio conversion: {e}")
         return False
-    finally:
-        # Clean up
-        if 'temp_g711_file' in locals() and os.path.exists(temp_g711_file):
-            os.unlink(temp_g711_file)
     
     return True
 
+def test_append_message():
+    """Test that input_audio_buffer.append messages carry the audio intact."""
+    print("\n🔧 Testing Audio Append Messages")
+    print("=" * 50)
+    
+    # A full slice and a short final slice whose length needs base64 padding,
+    # sliced from a memoryview the way append_audio does
+    audio_view = memoryview(bytes(range(256)) * (AUDIO_APPEND_CHUNK_SIZE // 128))
+    full_slice = audio_view[:AUDIO_APPEND_CHUNK_SIZE]
+    short_slice = audio_view[AUDIO_APPEND_CHUNK_SIZE:AUDIO_APPEND_CHUNK_SIZE + 1001]
+    for chunk in (full_slice, short_slice):
+        message = json.loads(_APPEND_MESSAGE_PREFIX + b64encode_str(chunk) + _APPEND_MESSAGE_SUFFIX)
+        
+        if message.get('type') != 'input_audio_buffer.append':
+            print(f"❌ Incorrect message type: {message.get('type')}")
+            return False
+        
+        if base64.b64decode(message['audio']) != chunk:
+            print(f"❌ Audio did not round-trip for a {len(chunk)} byte slice")
+            return False
+    
+    print("✅ Append messages are valid JSON and decode back to the original audio")
+    return True
+
 def test_session_config():
     """Test the session configuration structure."""
     print("\n🔧 Testing Session Configuration")
@@ -78,7 +94,8 @@ def test_session_config():
     
     # Test AI prompt replacement
     from test_openai_realtime import AI_PROMPT_AGENT
-    agent_prompt = AI_PROMPT_AGENT.replace('[CALLER_LANGUAGE]', "Danish")
+    from realtime_io import build_prompt, split_prompt
+    agent_prompt = build_prompt(split_prompt(AI_PROMPT_AGENT), "Danish")
     
     if "Danish" in agent_prompt and "[CALLER_LANGUAGE]" not in agent_prompt:
         print("✅ AI prompt replacement working correctly")
@@ -138,21 +155,25 @@ async def main():
     # Test audio conversion
     audio_test_passed = await test_audio_conversion()
     
+    # Test the hand-assembled append messages
+    append_test_passed = test_append_message()
+    
     # Test session configuration
     config_test_passed = test_session_config()
     
     print("\n📊 Test Results Summary")
     print("=" * 50)
     print(f"Audio Conversion: {'✅ PASS' if audio_test_passed else '❌ FAIL'}")
+    print(f"Append Messages:  {'✅ PASS' if append_test_passed else '❌ FAIL'}")
     print(f"Session Config:   {'✅ PASS' if config_test_passed else '❌ FAIL'}")
     
-    if audio_test_passed and config_test_passed:
+    if audio_test_passed and append_test_passed and config_test_passed:
         print("\n🎉 All tests passed! The script structure is correct.")
         print("The script should work properly with a valid OpenAI API key.")
     else:
         print("\n❌ Some tests failed. Please check the implementation.")
     
-    return audio_test_passed and config_test_passed
+    return audio_test_passed and append_test_passed and config_test_passed
 
 if __name__ == "__main__":
     success = asyncio.run(main())
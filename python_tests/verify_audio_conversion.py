@@ -5,37 +5,28 @@ This can be run without an OpenAI API key to test the audio processing pipeline.
 """
 
 import asyncio
-import tempfile
 import os
 import ffmpeg
 from pathlib import Path
 
-async def convert_mp3_to_g711_ulaw(input_file: str, output_file: str):
-    """Convert MP3 file to G.711 μ-law format."""
+from realtime_io import g711_ulaw_to_mp3, mp3_to_g711_ulaw
+
+async def convert_mp3_to_g711_ulaw(input_file: str):
+    """Convert MP3 file to G.711 μ-law format and return the encoded audio."""
     try:
-        (
-            ffmpeg
-            .input(input_file)
-            .output(output_file, acodec='pcm_mulaw', ar=8000, ac=1, f='wav')
-            .overwrite_output()
-            .run(quiet=True)
-        )
-        print(f"✅ Converted {input_file} to G.711 μ-law format: {output_file}")
-        return True
+        audio_data = await mp3_to_g711_ulaw(input_file)
+        print(f"✅ Converted {input_file} to G.711 μ-law format ({len(audio_data)} bytes)")
+        return audio_data
     except ffmpeg.Error as e:
         print(f"❌ Error converting audio: {e}")
-        return False
+        return None
 
-async def convert_g711_ulaw_to_mp3(input_file: str, output_file: str):
-    """Convert G.711 μ-law format back to MP3."""
+async def convert_g711_ulaw_to_mp3(audio_data: bytes, output_file: str):
+    """Convert G.711 μ-law audio back to MP3."""
     try:
-        (
-            ffmpeg
-            .input(input_file)
-            .output(output_file, acodec='libmp3lame', ar=8000, ac=1)
-            .overwrite_output()
-            .run(quiet=True)
-        )
+        # Plain encode: this checks the round trip, not the playback filters
+        # applied to the translated audio
+        await g711_ulaw_to_mp3(audio_data, output_file, enhance=False)
         print(f"✅ Converted G.711 μ-law to MP3: {output_file}")
         return True
     except ffmpeg.Error as e:
@@ -44,13 +35,14 @@ async def convert_g711_ulaw_to_mp3(input_file: str, output_file: str):
 
 def get_file_info(file_path: str):
     """Get basic file information."""
-    if os.path.exists(file_path):
-        size = os.path.getsize(file_path)
-        print(f"📁 {file_path}: {size} bytes")
-        return size
-    else:
+    # A single stat both checks that the file exists and gets its size
+    try:
+        size = os.stat(file_path).st_size
+    except FileNotFoundError:
         print(f"❌ File not found: {file_path}")
         return 0
+    print(f"📁 {file_path}: {size} bytes")
+    return size
 
 async def main():
     print("🔧 Audio Conversion Verification Test")
@@ -70,18 +62,15 @@ async def main():
     original_size = get_file_info(input_file)
     
     try:
-        # Create temporary files for conversion
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-            temp_g711_file = temp_file.name
-        
+        # The μ-law audio stays in memory between the two conversions
         print("\n🔄 Step 1: Converting MP3 to G.711 μ-law...")
-        success1 = await convert_mp3_to_g711_ulaw(input_file, temp_g711_file)
+        audio_data = await convert_mp3_to_g711_ulaw(input_file)
         
-        if success1:
-            g711_size = get_file_info(temp_g711_file)
+        if audio_data:
+            g711_size = len(audio_data)
             
             print("\n🔄 Step 2: Converting G.711 μ-law back to MP3...")
-            success2 = await convert_g711_ulaw_to_mp3(temp_g711_file, test_output)
+            success2 = await convert_g711_ulaw_to_mp3(audio_data, test_output)
             
             if success2:
                 final_size = get_file_info(test_output)
@@ -107,12 +96,6 @@ async def main():
         
     except Exception as e:
         print(f"\n❌ Error during conversion test: {e}")
-    finally:
-        # Clean up temporary file
-        try:
-            os.unlink(temp_g711_file)
-        except:
-            pass
     
     print("\n🏁 Verification test completed!")
 